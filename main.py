@@ -5,7 +5,11 @@ import re
 import time
 import random
 import asyncio
+import importlib.util
+import httpx
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import ChatMigrated, TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -25,6 +29,23 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 USERS_FILE = "/tmp/users_cache.json"
 MUTED_FILE = "/tmp/invisible_mutes.json"
 LAST_ADMIN_MSG_FILE = "/tmp/last_admin_message.json"
+CHAT_ALIASES_FILE = "/tmp/chat_aliases.json"
+
+# HTTP-пулы для Bot API: отдельно для медиа и для быстрых управляющих вызовов
+CONTROL_POOL_SIZE = int(os.getenv("CONTROL_POOL_SIZE", "16"))
+MEDIA_POOL_SIZE = int(os.getenv("MEDIA_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.getenv("POOL_TIMEOUT", "5.0"))
+MEDIA_WRITE_TIMEOUT = float(os.getenv("MEDIA_WRITE_TIMEOUT", "60.0"))
+KEEPALIVE_EXPIRY = float(os.getenv("KEEPALIVE_EXPIRY", "30.0"))
+POOL_WAIT_WARN = float(os.getenv("POOL_WAIT_WARN", "0.5"))
+# HTTP/2 включается, только если установлен пакет h2 (httpx[http2])
+HTTP2_ENABLED = os.getenv("HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+# Методы Bot API, которые идут через медиа-пул
+MEDIA_METHODS = {
+    "sendVideo", "sendDocument", "sendPhoto", "sendAudio", "sendVoice",
+    "sendSticker", "sendAnimation", "sendVideoNote", "sendMediaGroup",
+}
 
 # Запрещённые темы (семья, религия, национальность)
 FORBIDDEN_TOPICS = [
@@ -57,10 +78,16 @@ def load_data(filename, default):
             logger.error(f"Ошибка загрузки {filename}: {e}")
     return default
 
+def write_data(filename, data):
+    # Пишем во временный файл и подменяем, чтобы не оставить полузаписанный JSON
+    tmp = f"{filename}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, filename)
+
 def save_data(filename, data):
     try:
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        write_data(filename, data)
     except Exception as e:
         logger.error(f"Ошибка сохранения {filename}: {e}")
 
@@ -78,9 +105,11 @@ def load_muted_users():
         logger.error(f"Ошибка парсинга muted_users: {e}")
         return {}
 
+def serialize_muted_users(muted_dict):
+    return {f"{chat}:{user}": expiry for (chat, user), expiry in muted_dict.items()}
+
 def save_muted_users(muted_dict):
-    serializable = {f"{chat}:{user}": expiry for (chat, user), expiry in muted_dict.items()}
-    save_data(MUTED_FILE, serializable)
+    save_data(MUTED_FILE, serialize_muted_users(muted_dict))
 
 def load_last_admin_msg():
     return load_data(LAST_ADMIN_MSG_FILE, {})
@@ -88,6 +117,245 @@ def load_last_admin_msg():
 def save_last_admin_msg(data):
     save_data(LAST_ADMIN_MSG_FILE, data)
 
+# --- МИГРАЦИЯ ГРУПП (group → supergroup) ---
+# Таблица алиасов служит журналом миграций: она фиксируется одним os.replace,
+# а перенос данных в остальных хранилищах идемпотентен и доигрывается,
+# пока не завершится успешно (в том числе после рестарта)
+chat_aliases = None  # {старый_id: новый_id}, загружается лениво
+pending_migrations = set()  # старые id, данные которых ещё не перенесены
+
+def load_chat_aliases():
+    global chat_aliases
+    if chat_aliases is None:
+        chat_aliases = {int(k): v for k, v in load_data(CHAT_ALIASES_FILE, {}).items()}
+        pending_migrations.update(chat_aliases)
+    return chat_aliases
+
+def follow_aliases(aliases, chat_id):
+    seen = set()
+    while chat_id in aliases and chat_id not in seen:
+        seen.add(chat_id)
+        chat_id = aliases[chat_id]
+    return chat_id
+
+def apply_chat_migrations():
+    """Переносит данные старых id на новые во всех хранилищах; повторный запуск безопасен."""
+    aliases = load_chat_aliases()
+    if not pending_migrations:
+        return
+    targets = {old: follow_aliases(aliases, old) for old in pending_migrations}
+
+    # Пишем только изменившиеся хранилища: неудачное чтение ({}) не должно
+    # затирать данные на диске
+    staged = []
+
+    users = load_users()
+    moved = [old for old in targets if str(old) in users]
+    for old in moved:
+        new = str(targets[old])
+        users[new] = {**users.pop(str(old)), **users.get(new, {})}
+    if moved:
+        staged.append((USERS_FILE, users))
+
+    muted = load_muted_users()
+    moved = [k for k in muted if k[0] in targets]
+    for (chat, user) in moved:
+        expiry = muted.pop((chat, user))
+        new_key = (targets[chat], user)
+        muted[new_key] = max(expiry, muted.get(new_key, 0))
+    if moved:
+        staged.append((MUTED_FILE, serialize_muted_users(muted)))
+
+    # id сообщений при миграции не сохраняются, старые указатели не переносим
+    last_admin = load_last_admin_msg()
+    moved = [old for old in targets if str(old) in last_admin]
+    for old in moved:
+        del last_admin[str(old)]
+    if moved:
+        staged.append((LAST_ADMIN_MSG_FILE, last_admin))
+
+    try:
+        for filename, data in staged:
+            write_data(filename, data)
+    except Exception as e:
+        logger.error(f"Перенос данных мигрировавших чатов не завершён, будет повторён: {e}")
+        return
+    pending_migrations.difference_update(targets)
+
+def resolve_chat_id(chat_id):
+    apply_chat_migrations()
+    return follow_aliases(load_chat_aliases(), int(chat_id))
+
+def migrate_chat(application, old_id, new_id):
+    """Переводит чат на новый id: фиксирует алиас и переносит все данные чата."""
+    global chat_aliases
+    old_id, new_id = int(old_id), int(new_id)
+    if old_id == new_id:
+        return
+
+    aliases = dict(load_chat_aliases())
+    for k, v in aliases.items():
+        if v == old_id:
+            aliases[k] = new_id
+    aliases[old_id] = new_id
+    try:
+        write_data(CHAT_ALIASES_FILE, {str(k): v for k, v in aliases.items()})
+    except Exception as e:
+        logger.error(f"Ошибка миграции чата {old_id} → {new_id}: {e}")
+        return
+    chat_aliases = aliases
+    pending_migrations.add(old_id)
+    apply_chat_migrations()
+
+    # Отложенные ответы и выбранная админами группа живут в памяти;
+    # id сообщений старой группы в новой недействительны
+    for (chat, user) in [k for k in pending_replies if k[0] == old_id]:
+        entry = pending_replies.pop((chat, user))
+        if (new_id, user) in pending_replies:
+            # Сообщение под новым id пришло раньше сервисного: оставляем более новую задачу
+            if entry["task"]:
+                entry["task"].cancel()
+            continue
+        entry["message_id"] = None
+        pending_replies[(new_id, user)] = entry
+    for user_data in application.user_data.values():
+        if user_data.get("target_chat_id") == old_id:
+            user_data["target_chat_id"] = new_id
+    application.migrate_chat_data(old_chat_id=old_id, new_chat_id=new_id)
+
+    logger.info(f"Группа мигрировала: {old_id} → {new_id}")
+
+# --- HTTP-ПУЛЫ ---
+class PooledRequest(BaseRequest):
+    """HTTPXRequest с собственным лимитом соединений и счётчиками ожидания пула."""
+
+    def __init__(self, name: str, pool_size: int, write_timeout: float = 5.0):
+        self.name = name
+        self.pool_size = pool_size
+        self._slots = asyncio.Semaphore(pool_size)
+        self._request = HTTPXRequest(
+            connection_pool_size=pool_size,
+            pool_timeout=POOL_TIMEOUT,
+            write_timeout=write_timeout,
+            media_write_timeout=write_timeout,
+            http_version="2" if HTTP2_ENABLED else "1.1",
+            httpx_kwargs={
+                "limits": httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                )
+            },
+        )
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def read_timeout(self):
+        return self._request.read_timeout
+
+    async def initialize(self):
+        await self._request.initialize()
+
+    async def shutdown(self):
+        logger.info(f"HTTP-пул {self.name}: {self.stats()}")
+        await self._request.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.pool_size,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "requests": self.requests,
+            "waited": self.waited,
+            "timeouts": self.timeouts,
+            "avg_wait": round(self.total_wait / self.requests, 4) if self.requests else 0.0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        if pool_timeout is BaseRequest.DEFAULT_NONE:
+            pool_timeout = POOL_TIMEOUT
+
+        started = time.monotonic()
+        saturated = self._slots.locked()
+        timed_out = False
+        try:
+            await asyncio.wait_for(self._slots.acquire(), pool_timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+        wait = time.monotonic() - started
+
+        self.requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if saturated:
+            self.waited += 1
+        if timed_out:
+            self.timeouts += 1
+            logger.warning(f"HTTP-пул {self.name} переполнен ({self.pool_size}), ожидание > {pool_timeout} с")
+            raise TimedOut(f"Pool timeout: все {self.pool_size} соединений пула {self.name} заняты")
+        if wait >= POOL_WAIT_WARN:
+            logger.warning(f"HTTP-пул {self.name}: ожидание соединения {wait:.2f} с для {url.rsplit('/', 1)[-1]}")
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await self._request.do_request(
+                url, method, request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                # Слот уже занят, а лимит httpx равен размеру пула: свободное соединение
+                # гарантировано, повторно ждать пул httpx не нужно
+                pool_timeout=None,
+            )
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+
+class SplitRequest(BaseRequest):
+    """Направляет медиа-методы в отдельный пул, чтобы они не блокировали модерацию."""
+
+    def __init__(self):
+        self.control = PooledRequest("control", CONTROL_POOL_SIZE)
+        self.media = PooledRequest("media", MEDIA_POOL_SIZE, write_timeout=MEDIA_WRITE_TIMEOUT)
+
+    @property
+    def read_timeout(self):
+        return self.control.read_timeout
+
+    async def initialize(self):
+        await self.control.initialize()
+        await self.media.initialize()
+
+    async def shutdown(self):
+        await self.control.shutdown()
+        await self.media.shutdown()
+
+    def stats(self) -> dict:
+        return {"control": self.control.stats(), "media": self.media.stats()}
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        pool = self.media if url.rsplit("/", 1)[-1] in MEDIA_METHODS else self.control
+        return await pool.do_request(
+            url, method, request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+        )
+
 # --- ПРОВЕРКА НА ЗАПРЕЩЁННЫЕ ТЕМЫ ---
 def contains_forbidden_topic(text: str) -> bool:
     text_low = text.lower()
@@ -97,7 +365,8 @@ def contains_forbidden_topic(text: str) -> bool:
 async def debug_clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_USER_IDS:
         return
-    files_to_remove = [USERS_FILE, MUTED_FILE, LAST_ADMIN_MSG_FILE]
+    global chat_aliases
+    files_to_remove = [USERS_FILE, MUTED_FILE, LAST_ADMIN_MSG_FILE, CHAT_ALIASES_FILE]
     removed = []
     for f in files_to_remove:
         if os.path.exists(f):
@@ -106,22 +375,33 @@ async def debug_clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 removed.append(f)
             except Exception as e:
                 logger.error(f"Не удалось удалить {f}: {e}")
+    chat_aliases = None
+    pending_migrations.clear()
     msg = "🧹 Удалены файлы кэша." if removed else "✅ Нет файлов для удаления."
     await update.message.reply_text(msg)
 
 # --- ПОЛУЧЕНИЕ СПИСКА ГРУПП ---
 async def get_bot_groups(context: ContextTypes.DEFAULT_TYPE):
     groups = []
+    apply_chat_migrations()
     cache = load_users()
     for chat_id_str in list(cache.keys()):
         try:
             chat_id = int(chat_id_str)
-            chat = await context.bot.get_chat(chat_id)
-            if chat.type in ("group", "supergroup"):
+            try:
+                chat = await context.bot.get_chat(chat_id)
+            except ChatMigrated as e:
+                # Сервисное сообщение о миграции пропущено: переносим данные сейчас
+                migrate_chat(context.application, chat_id, e.new_chat_id)
+                chat_id_str = str(e.new_chat_id)
+                chat_id = e.new_chat_id
+                chat = await context.bot.get_chat(chat_id)
+            if chat.type in ("group", "supergroup") and all(chat_id != c for c, _ in groups):
                 title = chat.title or f"Группа {chat_id}"
                 groups.append((chat_id, title))
         except Exception as e:
             logger.warning(f"Чат {chat_id_str} недоступен: {e}")
+            cache = load_users()
             cache.pop(chat_id_str, None)
             save_users(cache)
     return groups
@@ -176,6 +456,7 @@ async def set_chosen_reaction(update: Update, context: ContextTypes.DEFAULT_TYPE
     if not chat_id:
         await query.edit_message_text("❌ Группа не выбрана.")
         return
+    chat_id = resolve_chat_id(chat_id)
 
     last_admin = load_last_admin_msg()
     chat_id_str = str(chat_id)
@@ -218,7 +499,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data.startswith("unmute:"):
         try:
             _, chat_id_str, user_id_str = data.split(":")
-            chat_id = int(chat_id_str)
+            chat_id = resolve_chat_id(chat_id_str)
             user_id = int(user_id_str)
         except:
             await query.edit_message_text("❌ Неверные данные.")
@@ -257,7 +538,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
     elif data.startswith("group:"):
-        chat_id = int(data.split(":", 1)[1])
+        chat_id = resolve_chat_id(data.split(":", 1)[1])
         try:
             chat = await context.bot.get_chat(chat_id)
             title = chat.title or str(chat_id)
@@ -301,7 +582,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("❌ Группа не выбрана.")
             return
         cache = load_users()
-        chat_id_str = str(chat_id)
+        chat_id_str = str(resolve_chat_id(chat_id))
         users = cache.get(chat_id_str, {})
         if not users:
             await query.edit_message_text("📭 В группе никто не писал.")
@@ -321,7 +602,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("❌ Группа не выбрана.")
             return
         cache = load_users()
-        chat_id_str = str(chat_id)
+        chat_id_str = str(resolve_chat_id(chat_id))
         user = cache[chat_id_str][user_id_str]
         user_id = int(user_id_str)
         bot = await context.bot.get_me()
@@ -360,6 +641,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not all([chat_id, user_id, name]):
             await query.edit_message_text("❌ Данные устарели.")
             return
+        chat_id = resolve_chat_id(chat_id)
 
         expiry = time.time() + seconds
         muted = load_muted_users()
@@ -369,11 +651,11 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         async def auto_unmute():
             await asyncio.sleep(seconds)
             current = load_muted_users()
-            key = (chat_id, user_id)
+            key = (resolve_chat_id(chat_id), user_id)
             if key in current and time.time() >= current[key] - 2:
                 del current[key]
                 save_muted_users(current)
-                logger.info(f"Авто-размут: {user_id} в {chat_id}")
+                logger.info(f"Авто-размут: {user_id} в {key[0]}")
 
         asyncio.create_task(auto_unmute())
         if seconds == 31536000:
@@ -392,6 +674,26 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
+# --- ПЕРЕСЫЛКА СООБЩЕНИЯ АДМИНА В ГРУППУ ---
+async def relay_to_group(bot, chat_id, msg) -> bool:
+    if msg.text:
+        await bot.send_message(chat_id=chat_id, text=msg.text)
+    elif msg.voice:
+        await bot.send_voice(chat_id=chat_id, voice=msg.voice.file_id)
+    elif msg.photo:
+        await bot.send_photo(chat_id=chat_id, photo=msg.photo[-1].file_id)
+    elif msg.video:
+        await bot.send_video(chat_id=chat_id, video=msg.video.file_id)
+    elif msg.document:
+        await bot.send_document(chat_id=chat_id, document=msg.document.file_id)
+    elif msg.audio:
+        await bot.send_audio(chat_id=chat_id, audio=msg.audio.file_id)
+    elif msg.sticker:
+        await bot.send_sticker(chat_id=chat_id, sticker=msg.sticker.file_id)
+    else:
+        return False
+    return True
+
 # --- ОБРАБОТЧИК ЛИЧНЫХ СООБЩЕНИЙ ОТ АДМИНА (НЕ ПЕРЕСЛАННЫХ) ---
 async def admin_private_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_USER_IDS:
@@ -405,34 +707,24 @@ async def admin_private_message(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("❌ Целевая группа не выбрана. Начните с /start.")
         return
 
+    chat_id = resolve_chat_id(chat_id)
+
     msg = update.effective_message
     try:
-        if msg.text:
-            await context.bot.send_message(chat_id=chat_id, text=msg.text)
-        elif msg.voice:
-            await context.bot.send_voice(chat_id=chat_id, voice=msg.voice.file_id)
-        elif msg.photo:
-            await context.bot.send_photo(chat_id=chat_id, photo=msg.photo[-1].file_id)
-        elif msg.video:
-            await context.bot.send_video(chat_id=chat_id, video=msg.video.file_id)
-        elif msg.document:
-            await context.bot.send_document(chat_id=chat_id, document=msg.document.file_id)
-        elif msg.audio:
-            await context.bot.send_audio(chat_id=chat_id, audio=msg.audio.file_id)
-        elif msg.sticker:
-            await context.bot.send_sticker(chat_id=chat_id, sticker=msg.sticker.file_id)
-        else:
+        try:
+            relayed = await relay_to_group(context.bot, chat_id, msg)
+        except ChatMigrated as e:
+            # Группа стала супергруппой: переносим данные и повторяем отправку в новый чат
+            migrate_chat(context.application, chat_id, e.new_chat_id)
+            chat_id = e.new_chat_id
+            relayed = await relay_to_group(context.bot, chat_id, msg)
+        if not relayed:
             await update.message.reply_text("⚠️ Тип сообщения не поддерживается.")
-            return
 
     except Exception as e:
         logger.error(f"Ошибка отправки в группу {chat_id}: {repr(e)}")
         err = str(e)
-        if "migrated" in err and "new chat id" in err:
-            new_id_match = re.search(r"New chat id: (-\d+)", err)
-            new_id = new_id_match.group(1) if new_id_match else "неизвестен"
-            text = f"❌ Группа мигрировала. Новый ID: {new_id}. Обновите выбор группы."
-        elif "bot is not a member" in err or "chat not found" in err:
+        if "bot is not a member" in err or "chat not found" in err:
             text = "❌ Бот не состоит в группе или группа недоступна."
         elif "can't send messages" in err:
             text = "❌ У бота нет прав на отправку сообщений в группе."
@@ -508,20 +800,16 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     msg = update.effective_message
 
     if msg.migrate_to_chat_id:
-        old_id = str(msg.chat.id)
-        new_id = str(msg.migrate_to_chat_id)
-        cache = load_users()
-        if old_id in cache:
-            cache[new_id] = cache.pop(old_id)
-            save_users(cache)
-            logger.info(f"Группа мигрировала: {old_id} → {new_id}")
+        migrate_chat(context.application, msg.chat.id, msg.migrate_to_chat_id)
         return
 
     if chat.type not in ("group", "supergroup") or user.is_bot or user.id == context.bot.id:
         return
 
+    # Обновления, пришедшие под старым id, относим к новому чату
+    chat_id = resolve_chat_id(chat.id)
     cache = load_users()
-    chat_id_str = str(chat.id)
+    chat_id_str = str(chat_id)
     if chat_id_str not in cache:
         cache[chat_id_str] = {}
     cache[chat_id_str][str(user.id)] = {
@@ -532,20 +820,22 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     }
     save_users(cache)
 
+    # id сообщения из старой группы в новой супергруппе недействителен
+    message_id = msg.message_id if chat_id == chat.id else None
+
     # === Сохраняем последнее сообщение админа в группе ===
-    if user.id in ADMIN_USER_IDS and (msg.text or msg.caption or msg.photo or msg.video or msg.document):
+    if message_id and user.id in ADMIN_USER_IDS and (msg.text or msg.caption or msg.photo or msg.video or msg.document):
         last_admin = load_last_admin_msg()
-        chat_id_str = str(chat.id)
         if chat_id_str not in last_admin:
             last_admin[chat_id_str] = {}
         last_admin[chat_id_str][str(user.id)] = {
-            "message_id": msg.message_id,
+            "message_id": message_id,
             "timestamp": time.time()
         }
         save_last_admin_msg(last_admin)
 
     muted = load_muted_users()
-    key = (chat.id, user.id)
+    key = (chat_id, user.id)
     is_muted = key in muted and time.time() < muted[key]
 
     if is_muted:
@@ -579,19 +869,21 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
                     ])
 
             try:
-                await context.bot.send_message(chat_id=chat.id, text=reply_text)
+                await context.bot.send_message(chat_id=resolve_chat_id(chat_id), text=reply_text)
             except:
                 pass
 
-            if time.time() >= muted[key]:
-                del muted[key]
-                save_muted_users(muted)
+            current = load_muted_users()
+            current_key = (resolve_chat_id(chat_id), user.id)
+            if current_key in current and time.time() >= current[current_key]:
+                del current[current_key]
+                save_muted_users(current)
 
         # Отмена предыдущей задачи (если есть)
-        task_key = (chat.id, user.id)
+        task_key = (chat_id, user.id)
         if task_key in pending_replies:
             pending_replies[task_key]["task"].cancel()
-        pending_replies[task_key] = {"task": asyncio.create_task(delayed_reply_muted()), "message_id": msg.message_id}
+        pending_replies[task_key] = {"task": asyncio.create_task(delayed_reply_muted()), "message_id": message_id}
         return
 
     if user.id in ALLOWED_USER_IDS:
@@ -599,29 +891,32 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
         if not text or contains_forbidden_topic(text):
             return
 
-        task_key = (chat.id, user.id)
+        task_key = (chat_id, user.id)
         if task_key in pending_replies:
             pending_replies[task_key]["task"].cancel()
 
         async def delayed_reply_normal():
             await asyncio.sleep(10)
-            if task_key in pending_replies and pending_replies[task_key]["task"].done():
+            # Группа могла мигрировать, пока задача ждала
+            current_key = (resolve_chat_id(chat_id), user.id)
+            if current_key in pending_replies and pending_replies[current_key]["task"].done():
                 return
             reply_text = await safe_generate_aggressive_reply(text)
             if reply_text:
-                target_msg_id = pending_replies.get(task_key, {}).get("message_id", msg.message_id)
+                current_key = (resolve_chat_id(chat_id), user.id)
+                target_msg_id = pending_replies.get(current_key, {}).get("message_id")
                 try:
                     await context.bot.send_message(
-                        chat_id=chat.id,
+                        chat_id=current_key[0],
                         text=reply_text,
                         reply_to_message_id=target_msg_id
                     )
                 except:
                     pass
-            pending_replies.pop(task_key, None)
+            pending_replies.pop(current_key, None)
 
         new_task = asyncio.create_task(delayed_reply_normal())
-        pending_replies[task_key] = {"task": new_task, "message_id": msg.message_id}
+        pending_replies[task_key] = {"task": new_task, "message_id": message_id}
 
 # --- ГЕНЕРАЦИЯ АГРЕССИВНОГО ОТВЕТА ЧЕРЕЗ GROQ ---
 async def generate_aggressive_reply(text: str) -> str | None:
@@ -717,7 +1012,11 @@ def main():
     if not BOT_TOKEN:
         raise RuntimeError("❌ BOT_TOKEN не задан в переменных окружения!")
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).request(SplitRequest()).build()
+    logger.info(
+        f"HTTP-пулы: control={CONTROL_POOL_SIZE}, media={MEDIA_POOL_SIZE}, "
+        f"HTTP/{'2' if HTTP2_ENABLED else '1.1'}, keep-alive {KEEPALIVE_EXPIRY} с"
+    )
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("clear", debug_clear))
@@ -0,0 +1,158 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import ChatMigrated
+
+import main
+
+OLD, NEW = -1001, -1002
+
+
+class StubApplication:
+    def __init__(self, user_data=None):
+        self.user_data = user_data or {}
+        self.migrated = []
+
+    def migrate_chat_data(self, old_chat_id, new_chat_id):
+        self.migrated.append((old_chat_id, new_chat_id))
+
+
+@pytest.fixture(autouse=True)
+def stores(tmp_path, monkeypatch):
+    for name in ("USERS_FILE", "MUTED_FILE", "LAST_ADMIN_MSG_FILE", "CHAT_ALIASES_FILE"):
+        monkeypatch.setattr(main, name, str(tmp_path / f"{name.lower()}.json"))
+    monkeypatch.setattr(main, "chat_aliases", None)
+    monkeypatch.setattr(main, "pending_migrations", set())
+    monkeypatch.setattr(main, "pending_replies", {})
+    main.save_users({str(OLD): {"5": {"id": 5}}})
+    main.save_muted_users({(OLD, 5): 9e9})
+    main.save_last_admin_msg({str(OLD): {"7": {"message_id": 3, "timestamp": 0}}})
+
+
+def test_migrate_chat_rekeys_stores_and_drops_message_pointers():
+    user_data = {"target_chat_id": OLD}
+    main.pending_replies[(OLD, 5)] = {"task": None, "message_id": 42}
+    app = StubApplication({7: user_data})
+
+    main.migrate_chat(app, OLD, NEW)
+
+    assert main.load_users() == {str(NEW): {"5": {"id": 5}}}
+    assert main.load_muted_users() == {(NEW, 5): 9e9}
+    assert main.load_last_admin_msg() == {}
+    assert main.pending_replies == {(NEW, 5): {"task": None, "message_id": None}}
+    assert user_data["target_chat_id"] == NEW
+    assert app.migrated == [(OLD, NEW)]
+    assert main.resolve_chat_id(OLD) == NEW
+
+
+def test_alias_chains_collapse():
+    app = StubApplication()
+    main.migrate_chat(app, OLD, NEW)
+    main.migrate_chat(app, NEW, -1003)
+
+    assert main.load_chat_aliases() == {OLD: -1003, NEW: -1003}
+    assert main.load_muted_users() == {(-1003, 5): 9e9}
+
+
+def test_interrupted_migration_is_replayed(monkeypatch):
+    real_write = main.write_data
+
+    def failing_write(filename, data):
+        if filename == main.MUTED_FILE:
+            raise OSError("disk full")
+        real_write(filename, data)
+
+    monkeypatch.setattr(main, "write_data", failing_write)
+    main.migrate_chat(StubApplication(), OLD, NEW)
+    assert (OLD, 5) in main.load_muted_users()
+
+    monkeypatch.setattr(main, "write_data", real_write)
+    assert main.resolve_chat_id(OLD) == NEW
+    assert main.load_muted_users() == {(NEW, 5): 9e9}
+    assert not main.pending_migrations
+
+
+def test_replay_does_not_rewrite_untouched_stores(monkeypatch):
+    main.migrate_chat(StubApplication(), OLD, NEW)
+    main.chat_aliases = None
+
+    written = []
+    monkeypatch.setattr(main, "write_data", lambda filename, data: written.append(filename))
+
+    assert main.resolve_chat_id(OLD) == NEW
+    assert written == []
+    assert not main.pending_migrations
+
+
+def test_moved_pending_reply_does_not_replace_newer_one():
+    class StubTask:
+        cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    old_task, new_task = StubTask(), StubTask()
+    main.pending_replies[(OLD, 5)] = {"task": old_task, "message_id": 42}
+    main.pending_replies[(NEW, 5)] = {"task": new_task, "message_id": 8}
+
+    main.migrate_chat(StubApplication(), OLD, NEW)
+
+    assert main.pending_replies == {(NEW, 5): {"task": new_task, "message_id": 8}}
+    assert old_task.cancelled
+    assert not new_task.cancelled
+
+
+def test_alias_journal_is_replayed_after_restart(monkeypatch):
+    main.write_data(main.CHAT_ALIASES_FILE, {str(OLD): NEW})
+
+    assert main.resolve_chat_id(OLD) == NEW
+    assert main.load_users() == {str(NEW): {"5": {"id": 5}}}
+    assert main.load_muted_users() == {(NEW, 5): 9e9}
+
+
+def test_admin_relay_migrates_and_retries():
+    sent = []
+
+    async def send_message(chat_id, text):
+        if chat_id == OLD:
+            raise ChatMigrated(NEW)
+        sent.append((chat_id, text))
+
+    replies = []
+
+    async def reply_text(text):
+        replies.append(text)
+
+    user_data = {"mode": "send_message", "target_chat_id": OLD}
+    app = StubApplication({1: user_data})
+    message = SimpleNamespace(text="hi", reply_text=reply_text)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1), effective_message=message, message=message)
+    context = SimpleNamespace(user_data=user_data, application=app, bot=SimpleNamespace(send_message=send_message))
+
+    main.ADMIN_USER_IDS.append(1)
+    try:
+        asyncio.run(main.admin_private_message(update, context))
+    finally:
+        main.ADMIN_USER_IDS.remove(1)
+
+    assert sent == [(NEW, "hi")]
+    assert replies == []
+    assert user_data["target_chat_id"] == NEW
+    assert main.resolve_chat_id(OLD) == NEW
+
+
+def test_group_list_migrates_chat_instead_of_dropping_it():
+    async def get_chat(chat_id):
+        if chat_id == OLD:
+            raise ChatMigrated(NEW)
+        return SimpleNamespace(type="supergroup", title="Группа")
+
+    context = SimpleNamespace(application=StubApplication(), bot=SimpleNamespace(get_chat=get_chat))
+
+    groups = asyncio.run(main.get_bot_groups(context))
+
+    assert groups == [(NEW, "Группа")]
+    assert main.load_users() == {str(NEW): {"5": {"id": 5}}}
+    assert main.load_muted_users() == {(NEW, 5): 9e9}
+    assert main.resolve_chat_id(OLD) == NEW
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from telegram.error import TimedOut
+
+import main
+
+API = "https://api.telegram.org/botTOKEN"
+
+
+class StubHTTPXRequest:
+    """Заглушка HTTPXRequest: медиа-методы «грузятся», пока не выставлено событие, остальные отвечают сразу."""
+
+    def __init__(self, uploaded):
+        self.uploaded = uploaded
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        if url.rsplit("/", 1)[-1] in main.MEDIA_METHODS:
+            await self.uploaded.wait()
+        return 200, b'{"ok": true, "result": true}'
+
+
+def stub(pool, uploaded):
+    pool._request = StubHTTPXRequest(uploaded)
+    return pool
+
+
+async def start_uploads(request, count):
+    uploads = [asyncio.create_task(request.do_request(f"{API}/sendVideo", "POST")) for _ in range(count)]
+    await asyncio.sleep(0)
+    return uploads
+
+
+def test_control_calls_do_not_wait_for_media_uploads():
+    request = main.SplitRequest()
+
+    async def run():
+        uploaded = asyncio.Event()
+        stub(request.control, uploaded)
+        stub(request.media, uploaded)
+        uploads = await start_uploads(request, request.media.pool_size * 2)
+
+        # Загрузки ещё висят, а модерация уже прошла
+        await request.do_request(f"{API}/deleteMessage", "POST")
+        await request.do_request(f"{API}/setMessageReaction", "POST")
+        in_flight = request.media.in_flight
+
+        uploaded.set()
+        await asyncio.gather(*uploads)
+        return in_flight
+
+    assert asyncio.run(run()) == request.media.pool_size
+    stats = request.stats()
+    assert stats["control"]["waited"] == 0
+    assert stats["control"]["requests"] == 2
+    assert stats["media"]["waited"] == request.media.pool_size
+    assert stats["media"]["max_in_flight"] == request.media.pool_size
+
+
+def test_shared_pool_blocks_control_calls_behind_uploads():
+    # Для сравнения: один общий пул того же размера, что и медиа-пул
+    request = main.PooledRequest("shared", main.MEDIA_POOL_SIZE)
+
+    async def run():
+        uploaded = asyncio.Event()
+        stub(request, uploaded)
+        uploads = await start_uploads(request, request.pool_size)
+
+        delete = asyncio.create_task(request.do_request(f"{API}/deleteMessage", "POST"))
+        await asyncio.sleep(0)
+        blocked = not delete.done()
+
+        uploaded.set()
+        await asyncio.gather(delete, *uploads)
+        return blocked
+
+    assert asyncio.run(run())
+    stats = request.stats()
+    assert stats["waited"] == 1
+    assert stats["max_in_flight"] == request.pool_size
+
+
+def test_pool_timeout_is_per_call_and_counted():
+    request = main.PooledRequest("media", 1)
+
+    async def run():
+        uploaded = asyncio.Event()
+        stub(request, uploaded)
+        uploads = await start_uploads(request, 1)
+        with pytest.raises(TimedOut):
+            await request.do_request(f"{API}/sendDocument", "POST", pool_timeout=0.05)
+        in_flight = request.in_flight
+        uploaded.set()
+        await asyncio.gather(*uploads)
+        return in_flight
+
+    assert asyncio.run(run()) == 1
+    stats = request.stats()
+    assert stats["timeouts"] == 1
+    assert stats["requests"] == 2
+    assert stats["waited"] == 1
+    assert stats["in_flight"] == 0